@@ -8,13 +8,12 @@ from shiny import reactive, render
 # From shiny.express, import just ui and inputs if needed
 from shiny.express import ui
 
-import random
 from datetime import datetime
-from collections import deque
+from collections import namedtuple
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 from shinywidgets import render_plotly
-from scipy import stats
 from faicons import icon_svg
 
 # --------------------------------------------
@@ -33,18 +32,81 @@ UPDATE_INTERVAL_SECS: int = 3
 # Initialize a REACTIVE VALUE with a common data structure
 # The reactive value is used to store state (information)
 # Used by all the display components that show this live data.
-# This reactive value is a wrapper around a DEQUE of readings
+# This reactive value is a wrapper around a RING BUFFER of readings:
+# one numpy array per column, a write position (head) and a count.
+# Each update overwrites the oldest slot, like a deque with a maxlen.
 # --------------------------------------------
 
 DEQUE_SIZE: int = 5
-reactive_value_wrapper = reactive.value(deque(maxlen=DEQUE_SIZE))
+
+Ring = namedtuple("Ring", ["temps", "ts", "head", "count"])
+
+reactive_value_wrapper = reactive.value(
+    Ring(
+        # Fill unused slots with NaN/NaT rather than np.empty garbage, which
+        # pandas 1.x rejects as an out-of-bounds nanosecond timestamp
+        temps=np.full(DEQUE_SIZE, np.nan, dtype="float64"),
+        ts=np.full(DEQUE_SIZE, np.datetime64("NaT"), dtype="datetime64[s]"),
+        head=0,
+        count=0,
+    )
+)
+
+# --------------------------------------------
+# A small named tuple holds what the reactive calc returns.
+# Callers read only the attribute they need instead of unpacking a tuple.
+# (A dataclass does not work here: Shiny Express runs this file with
+# string annotations and outside sys.modules, so dataclasses cannot
+# resolve the field types.)
+# --------------------------------------------
+
+Snapshot = namedtuple("Snapshot", ["df", "latest"])
+
+# --------------------------------------------
+# A second REACTIVE VALUE that only changes when the temperature moves
+# by more than TEMP_CHANGE_THRESHOLD. The chart update effect depends on
+# this value instead of the raw tick, so it skips updates that would
+# look the same.
+# --------------------------------------------
+
+TEMP_CHANGE_THRESHOLD: float = 0.05
+last_rendered_temp = reactive.value(None)
+
+# One numpy random generator (PCG64) shared by every update
+rng = np.random.default_rng()
+
+# The regression x values are just 0..n-1 and n is at most DEQUE_SIZE,
+# so build every possible x vector once and look it up by length
+X_CACHE = [np.arange(n, dtype=np.float64) for n in range(DEQUE_SIZE + 1)]
+
+# --------------------------------------------
+# Produce one reading and write it into a ring buffer.
+# Drawing the temperature, converting it to Fahrenheit and writing the
+# slot all happen in one plain function, so a batch of readings (for
+# example a backfill after raising DEQUE_SIZE) can call it in a loop
+# without going through the reactive calc.
+# --------------------------------------------
+
+
+def add_reading(ring, timestamp):
+    """Write a new simulated reading at head and return the advanced ring and the temperature"""
+    # Data generation logic for Omaha, NE
+    temp_celsius = round(float(rng.uniform(0, 5)), 1)  # Temperature range for Omaha in Celsius
+    temp_fahrenheit = temp_celsius * 1.8 + 32  # Convert temperature to Fahrenheit
+
+    size = ring.temps.size
+    ring.temps[ring.head] = temp_fahrenheit
+    ring.ts[ring.head] = np.datetime64(timestamp, "s")
+    ring = ring._replace(head=(ring.head + 1) % size, count=min(ring.count + 1, size))
+    return ring, temp_fahrenheit
+
 
 # --------------------------------------------
 # Initialize a REACTIVE CALC that all display components can call
 # to get the latest data and display it.
 # The calculation is invalidated every UPDATE_INTERVAL_SECS
 # to trigger updates.
-# It returns a tuple with everything needed to display the data.
+# It returns a Snapshot with everything needed to display the data.
 # Very easy to expand or modify.
 # --------------------------------------------
 
@@ -54,27 +116,72 @@ def reactive_calc_combined():
     # Invalidate this calculation every UPDATE_INTERVAL_SECS to trigger updates
     reactive.invalidate_later(UPDATE_INTERVAL_SECS)
 
-    # Data generation logic for Omaha, NE
-    temp_celsius = round(random.uniform(0, 5), 1)  # Temperature range for Omaha in Celsius
-    temp_fahrenheit = temp_celsius * 9/5 + 32  # Convert temperature to Fahrenheit
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    new_dictionary_entry = {"temp": temp_fahrenheit, "timestamp": timestamp}
+    timestamp = datetime.now()  # Keep the native datetime; format only for display
 
-    # get the deque and append the new entry
-    reactive_value_wrapper.get().append(new_dictionary_entry)
-
-    # Get a snapshot of the current deque for any further processing
-    deque_snapshot = reactive_value_wrapper.get()
+    # Get the ring buffer without taking a reactive dependency on it,
+    # add the new reading, then store the advanced head and count.
+    # Every read of reactive_value_wrapper is isolated, so this set()
+    # only saves state; it does not notify anything.
+    with reactive.isolate():
+        ring = reactive_value_wrapper.get()
+    ring, temp_fahrenheit = add_reading(ring, timestamp)
+    reactive_value_wrapper.set(ring)
+    new_dictionary_entry = {"temp": temp_fahrenheit, "timestamp": timestamp}
 
-    # For Display: Convert deque to DataFrame for display
-    df = pd.DataFrame(deque_snapshot)
+    # Only notify the chart when the temperature changed meaningfully.
+    # This set() is the one side effect here that triggers anything:
+    # update_plot depends on last_rendered_temp.
+    with reactive.isolate():
+        last_temp = last_rendered_temp.get()
+    if last_temp is None or abs(temp_fahrenheit - last_temp) > TEMP_CHANGE_THRESHOLD:
+        last_rendered_temp.set(temp_fahrenheit)
+
+    # For Display: Put the readings in oldest-to-newest order and wrap them
+    # in a DataFrame. Before the buffer is full, head == count and the
+    # first slice is empty.
+    df = pd.DataFrame(
+        {
+            "temp": np.concatenate((ring.temps[ring.head:ring.count], ring.temps[:ring.head])),
+            "timestamp": np.concatenate((ring.ts[ring.head:ring.count], ring.ts[:ring.head])),
+        }
+    )
 
     # For Display: Get the latest dictionary entry
     latest_dictionary_entry = new_dictionary_entry
 
-    # Return a tuple with everything we need
+    # Return a Snapshot with everything we need
     # Every time we call this function, we'll get all these values
-    return deque_snapshot, df, latest_dictionary_entry
+    return Snapshot(df=df, latest=latest_dictionary_entry)
+
+
+# --------------------------------------------
+# Fit the trend line for the chart.
+# A plain function, not a reactive calc: a wrapper calc around
+# reactive_calc_combined would be invalidated on every tick anyway.
+# --------------------------------------------
+
+
+def fit_trend(df):
+    """Return timestamp and temperature arrays plus the regression line, slope and intercept"""
+    # Work on the raw numpy arrays rather than going through pandas indexing.
+    # Timestamps become Python datetimes: plotly sends a raw datetime64 array
+    # with tolist(), and under pandas < 2 the column is datetime64[ns], whose
+    # tolist() gives integer nanoseconds instead of dates.
+    timestamps = df["timestamp"].to_numpy(copy=False).astype("datetime64[s]").astype(object)
+    y_vals = df["temp"].to_numpy(copy=False)
+
+    # Linear regression (closed-form least squares with numpy)
+    x_vals = X_CACHE[y_vals.size]
+    x_mean = x_vals.mean()
+    y_mean = y_vals.mean()
+    x_dev = x_vals - x_mean
+    x_var = (x_dev ** 2).sum()
+    # A single reading has no spread in x, so draw a flat line through it
+    slope = (x_dev * (y_vals - y_mean)).sum() / x_var if x_var else 0.0
+    intercept = y_mean - slope * x_mean
+    best_fit_line = slope * x_vals + intercept
+
+    return timestamps, y_vals, best_fit_line, slope, intercept
 
 
 # Define the Shiny UI Page layout
@@ -125,8 +232,7 @@ with ui.layout_columns():
         @render.text
         def display_temp():
             """Get the latest reading and return a temperature string"""
-            deque_snapshot, df, latest_dictionary_entry = reactive_calc_combined()
-            return f"{latest_dictionary_entry['temp']} F"
+            return f"{reactive_calc_combined().latest['temp']} F"
 
         "Is it raining, is it snowing? Is a hurricane a-blowing? - Willy Wonka" 
 
@@ -138,10 +244,9 @@ with ui.layout_columns():
         @render.text
         def display_time():
            """Get the latest reading and return a timestamp string"""
-           deque_snapshot, df, latest_dictionary_entry = reactive_calc_combined()
-           timestamp = latest_dictionary_entry['timestamp']
-           date_string = timestamp.split()[0]  # Extracting date
-           time_string = timestamp.split()[1]  # Extracting time
+           timestamp = reactive_calc_combined().latest["timestamp"]
+           date_string = timestamp.date().isoformat()  # Extracting date
+           time_string = timestamp.time().isoformat(timespec="seconds")  # Extracting time
            return f"Date: {date_string}\nTime: {time_string}"
 
 
@@ -152,61 +257,82 @@ with ui.card(full_screen=True , style="background-color: lightgray"):
     @render.data_frame
     def display_df():
         """Get the latest reading and return a dataframe with current readings"""
-        deque_snapshot, df, latest_dictionary_entry = reactive_calc_combined()
-        pd.set_option('display.width', None)        # Use maximum width
+        df = reactive_calc_combined().df
+        # Show timestamps as "YYYY-MM-DD HH:MM:SS" strings so the grid does not
+        # depend on how a given shiny version serializes datetime columns
+        df = df.assign(timestamp=df["timestamp"].astype(str))
         return render.DataGrid( df,width="100%")
 
 with ui.card(style="background-color: lightgray"):
     ui.card_header("Chart with Current Trend")
 
+    # --------------------------------------------
+    # Build the trend chart once as a FigureWidget.
+    # display_plot has no reactive dependencies, so it renders once per
+    # session; update_plot then replaces the trace data and moves the
+    # annotation on display_plot.widget instead of rebuilding the figure.
+    # Scattergl traces are drawn with WebGL, so the chart stays fast
+    # in the browser if DEQUE_SIZE is raised.
+    # --------------------------------------------
+
     @render_plotly
     def display_plot():
-        # Fetch from the reactive calc function
-        deque_snapshot, df, latest_dictionary_entry = reactive_calc_combined()
-
-        # Ensure the DataFrame is not empty before plotting
-        if not df.empty:
-            # Convert the 'timestamp' column to datetime for better plotting
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
-
-            # Create scatter plot for readings
-            fig = px.scatter(df,
-                             x="timestamp",
-                             y="temp",
-                             title="Temperature Readings with Regression Line",
-                             labels={"temp": "Temperature (°F)", "timestamp": "Time"},
-                             color_discrete_sequence=["black"])
-
-            # Linear regression
-            sequence = range(len(df))
-            x_vals = list(sequence)
-            y_vals = df["temp"]
-
-            slope, intercept, r_value, p_value, std_err = stats.linregress(x_vals, y_vals)
-            df['best_fit_line'] = [slope * x + intercept for x in x_vals]
-
-            # Add the regression line to the figure
-            fig.add_scatter(x=df["timestamp"], y=df['best_fit_line'], mode='lines', name='Regression Line')
-
-            # Label the regression line with its formula
-            annotation_text = f'y = {slope:.2f}x + {intercept:.2f}'
-            fig.add_annotation(x=df["timestamp"].iloc[int(len(df) / 2)],  # Position the annotation at the midpoint of the x-axis
-                               y=df['best_fit_line'].iloc[int(len(df) / 2)],  # Position the annotation at the midpoint of the regression line
-                               text=annotation_text,
-                               showarrow=False,
-                               font=dict(size=12, color="blue"),  # Set font properties
-                               align="center",  # Center align the annotation text
-                               bgcolor="lightblue",  # Set background color of the annotation
-                               bordercolor="blue",  # Set border color of the annotation
-                               borderwidth=1,  # Set border width of the annotation
-                               borderpad=4  # Set padding of the border
-                               )
-
-            # Update layout as needed to customize further
-            fig.update_layout(xaxis_title="Time", yaxis_title="Temperature (°F)")
-
-            return fig
-
-        # If DataFrame is empty, return an empty figure.
-        else:
-            return px.scatter(title="No Data Available")
+        """Build the trend chart once; update_plot changes it in place"""
+        return go.FigureWidget(
+            data=[
+                go.Scattergl(mode="markers", name="temp", marker=dict(color="black")),
+                go.Scattergl(mode="lines", name="Regression Line"),
+            ],
+            layout=go.Layout(
+                title="Temperature Readings with Regression Line",
+                xaxis_title="Time",
+                yaxis_title="Temperature (°F)",
+                annotations=[
+                    go.layout.Annotation(
+                        showarrow=False,
+                        font=dict(size=12, color="blue"),  # Set font properties
+                        align="center",  # Center align the annotation text
+                        bgcolor="lightblue",  # Set background color of the annotation
+                        bordercolor="blue",  # Set border color of the annotation
+                        borderwidth=1,  # Set border width of the annotation
+                        borderpad=4,  # Set padding of the border
+                        visible=False,  # Hidden until there is data to label
+                    )
+                ],
+            ),
+        )
+
+    @reactive.effect
+    def update_plot():
+        """Copy the latest readings and regression into the rendered chart"""
+        # Reading display_plot.widget waits for the first render, then
+        # reruns this effect once the widget exists
+        trend_fig = display_plot.widget
+
+        # Update only when last_rendered_temp changes, not on every tick
+        last_rendered_temp.get()
+
+        # Fetch the readings and regression without depending on the tick
+        with reactive.isolate():
+            timestamps, temps, best_fit_line, slope, intercept = fit_trend(reactive_calc_combined().df)
+
+        # Ensure there are readings before plotting
+        if temps.size:
+            # Update the existing figure in one batch instead of rebuilding it
+            with trend_fig.batch_update():
+                # Scatter points for readings
+                trend_fig.data[0].x = timestamps
+                trend_fig.data[0].y = temps
+
+                # The regression line
+                trend_fig.data[1].x = timestamps
+                trend_fig.data[1].y = best_fit_line
+
+                # Label the regression line with its formula at its midpoint
+                mid = best_fit_line.size // 2
+                trend_fig.layout.annotations[0].update(
+                    x=timestamps[mid],
+                    y=best_fit_line[mid],
+                    text=f'y = {slope:.2f}x + {intercept:.2f}',
+                    visible=True,
+                )